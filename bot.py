@@ -13,9 +13,13 @@ from config import settings
 logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s %(message)s')
 logger = logging.getLogger("bot")
 
+# Important: Slash commands only need guild events; every extra intent adds gateway traffic to decode & dispatch.
 INTENTS = discord.Intents.none()
 INTENTS.guilds = True
-INTENTS.messages = True  # Important: Enabled preemptively for future contextual features.
+if settings.enable_message_content:
+    # LM: Opt-in for future contextual features; message_content is privileged (enable it in the developer portal too).
+    INTENTS.messages = True
+    INTENTS.message_content = True
 
 
 class Bot(commands.Bot):
@@ -1,20 +1,25 @@
 from __future__ import annotations
-from pydantic import BaseSettings, Field
+from pydantic import Field
+from pydantic_settings import BaseSettings, SettingsConfigDict
 from pathlib import Path
-from typing import Optional
+from typing import Literal, Optional
 
-# LM: Centralized runtime configuration using pydantic BaseSettings.
+# LM: Centralized runtime configuration using pydantic-settings (v2) BaseSettings.
 # Important: All secrets (tokens, credentials) are loaded from environment / .env; never hardcode sensitive values.
 # TODO Next Steps: Add validation to ensure at least one feature flag is enabled or warn on no-feature mode.
 # ? Consideration: Might introduce a SettingsFactory for multi-environment overrides (local, staging, prod).
 
 class Settings(BaseSettings):
+    # Important: Frozen after load; settings are read-only at runtime so hot-path flag checks are plain attribute reads.
+    model_config = SettingsConfigDict(env_file=".env", case_sensitive=False, frozen=True, extra="ignore")
+
     # Discord
     discord_bot_token: str = Field(..., alias="DISCORD_BOT_TOKEN")  # Important: Required to start the bot.
 
     # Feature flags
     enable_pdf_qa: bool = Field(default=False, alias="ENABLE_PDF_QA")  # TODO Next Steps: Document in README feature flags section.
     enable_openai: bool = Field(default=False, alias="ENABLE_OPENAI")  # TODO Next Steps: Gate LLM-based summarization when added.
+    enable_message_content: bool = Field(default=False, alias="ENABLE_MESSAGE_CONTENT")  # LM: Message events/content intents; off unless a feature reads messages.
 
     # Google Drive
     google_drive_folder_id: Optional[str] = Field(default=None, alias="GOOGLE_DRIVE_FOLDER_ID")  # TODO Next Steps: Required when Drive sync implemented.
@@ -23,17 +28,21 @@ class Settings(BaseSettings):
     # Embeddings
     embeddings_provider: str = Field(default="local", alias="EMBEDDINGS_PROVIDER")  # local|openai
     embeddings_model: str = Field(default="all-MiniLM-L6-v2", alias="EMBEDDINGS_MODEL")  # ? Consideration: Expose list of allowed models.
+    embeddings_quantize: Literal["none", "int8", "fp16"] = Field(default="none", alias="EMBEDDINGS_QUANTIZE")  # LM: int8 = CPU dynamic quantization; fp16 = GPU only.
+
+    # Vector store & retrieval
+    vector_backend: Literal["chroma", "faiss"] = Field(default="chroma", alias="VECTOR_BACKEND")  # LM: faiss = exact in-process search for small corpora.
+    enable_mmr: bool = Field(default=False, alias="ENABLE_MMR")  # LM: Diversify /ask excerpts with MMR re-ranking.
+
+    # Ingestion
+    ingest_workers: int = Field(default=4, alias="INGEST_WORKERS")  # LM: Worker processes parsing PDFs during /sync_pdfs.
 
     # Paths
     data_dir: Path = Field(default=Path("data"))  # LM: Base data directory (git-ignored).
     drive_raw_dir: Path = Field(default=Path("data/drive_raw"))  # LM: Original PDF sources.
     ingest_dir: Path = Field(default=Path("data/ingest"))  # TODO Next Steps: Future extracted text caching.
-    chunk_dir: Path = Field(default=Path("data/chunks"))  # LM: Chunk metadata (JSONL).
-    vector_dir: Path = Field(default=Path("data/vector"))  # LM: Persistent vector DB files.
-
-    class Config:
-        env_file = ".env"
-        case_sensitive = False
+    chunk_dir: Path = Field(default=Path("data/chunks"))  # LM: Chunk metadata (Parquet sidecars).
+    vector_dir: Path = Field(default=Path("data/vector"))  # LM: Persistent vector DB files + per-store ingest manifest.
 
 # Important: Instantiating settings triggers .env load & field coercion.
 settings = Settings()  # type: ignore
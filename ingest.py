@@ -0,0 +1,205 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator, List, Optional, Sequence
+from bisect import bisect_right
+import logging
+import re
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from blake3 import blake3
+from pypdf import PdfReader
+from pypdf.errors import PdfReadError
+
+try:
+    # ? Consideration: PyMuPDF (MuPDF C parser) is much faster than pypdf but AGPL-licensed, so it stays opt-in.
+    import pymupdf
+except ImportError:  # pragma: no cover - optional dependency
+    pymupdf = None
+
+# LM: CPU-bound ingestion stage: PDF -> page text -> chunks (+ metadata sidecar). No embedding / vector store here.
+# Important: Runs inside worker processes (see `knowledge_cog.sync_pdfs`); keep imports light and results picklable.
+
+logger = logging.getLogger("ingest")
+
+# LM: Sentence end = terminal punctuation followed by whitespace; chunk boundaries snap to these offsets.
+_SENTENCE_END = re.compile(r"[.!?]\s+")
+
+# LM: Column layout of the per-PDF chunk metadata sidecar (`<stem>.chunks.parquet`).
+_CHUNK_META_SCHEMA = pa.schema(
+    [
+        ("id", pa.string()),
+        ("source_file", pa.string()),
+        ("page", pa.int32()),
+        ("session", pa.int32()),
+        ("offset", pa.int32()),
+        ("hash", pa.string()),
+        ("len", pa.int32()),
+    ]
+)
+
+
+@dataclass
+class Chunk:
+    # LM: Represents a single semantic chunk of text with provenance metadata.
+    id: str
+    source_file: str
+    page: int
+    session: Optional[int]
+    offset: int
+    text: str
+    digest: str
+
+    def to_metadata(self) -> dict:
+        meta = {
+            "source_file": self.source_file,
+            "page": self.page,
+            "session": self.session,
+            "offset": self.offset,
+            "hash": self.digest,
+            # Important: Legacy key kept for existing metadata readers; holds the same BLAKE3 digest.
+            "sha256": self.digest,
+        }
+        # Important: Chroma rejects None metadata values (e.g. no session in the filename); readers use `.get`.
+        return {k: v for k, v in meta.items() if v is not None}
+
+
+def chunk_digest(text: str) -> str:
+    # LM: Content fingerprint for chunk IDs & cache keys (16 hex chars); de-duplication only, not security.
+    return blake3(text.encode("utf-8")).hexdigest(length=8)
+
+
+def file_digest(path: Path) -> str:
+    # LM: Whole-file fingerprint used by the ingest manifest to skip unchanged PDFs.
+    h = blake3()
+    with path.open("rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def guess_session_from_filename(name: str) -> Optional[int]:
+    # LM: Extract session number from typical filename patterns.
+    # ? Consideration: Might add mapping file for irregular naming.
+    # Heuristic: file names like Session_04.pdf, session-7.pdf, S08_Notes.pdf
+    m = re.search(r"[Ss](?:ession)?[ _-]?([0-9]{1,2})", name)
+    if m:
+        try:
+            return int(m.group(1))
+        except ValueError:
+            return None
+    return None
+
+
+def extract_text_from_pdf(path: Path) -> List[str]:
+    # LM: Returns list of page texts; blank string placeholder on extraction failure to preserve page indexing.
+    # LM: Uses PyMuPDF when installed, otherwise falls back to pure-Python pypdf.
+    if pymupdf is not None:
+        return _extract_with_pymupdf(path)
+    return _extract_with_pypdf(path)
+
+
+def _extract_with_pymupdf(path: Path) -> List[str]:
+    try:
+        doc = pymupdf.open(str(path))
+    except pymupdf.FileDataError:
+        # Important: A corrupt/non-PDF file yields no pages instead of failing the whole sync.
+        logger.warning("Skipping unreadable PDF %s", path.name, exc_info=True)
+        return []
+    pages: List[str] = []
+    with doc:
+        for page in doc:
+            try:
+                pages.append(page.get_text("text") or "")
+            except Exception:
+                pages.append("")
+    return pages
+
+
+def _extract_with_pypdf(path: Path) -> List[str]:
+    # Important: PdfReader resolves objects lazily from one shared stream and is not thread-safe;
+    # concurrency happens across PDFs (worker processes in `sync_pdfs`), never across pages of the same reader.
+    try:
+        reader = PdfReader(str(path))
+    except PdfReadError:
+        logger.warning("Skipping unreadable PDF %s", path.name, exc_info=True)
+        return []
+    pages: List[str] = []
+    for p in reader.pages:
+        try:
+            pages.append(p.extract_text() or "")
+        except Exception:
+            pages.append("")
+    return pages
+
+
+def chunk_text(pages: Sequence[str], *, max_chars: int = 1100, overlap: int = 180) -> Iterator[tuple[int, int, str]]:
+    # Important: Overlap preserves context continuity across boundaries for retrieval coherence.
+    # LM: Yields (page, offset, text); chunk ends snap back to the last sentence boundary within the window.
+    # TODO Next Steps: Consider token-based segmentation for multilingual support.
+    # Important: Never snap below this floor, so every step still advances past the overlap.
+    min_span = max(max_chars // 2, overlap + 1)
+    for page_index, page_text in enumerate(pages, start=1):
+        txt = page_text.strip()
+        if not txt:
+            continue
+        n = len(txt)
+        bounds = [m.end() for m in _SENTENCE_END.finditer(txt)]
+        start = 0
+        while start < n:
+            end = min(n, start + max_chars)
+            if end < n:
+                i = bisect_right(bounds, end) - 1
+                if i >= 0 and bounds[i] >= start + min_span:
+                    end = bounds[i]
+            piece = txt[start:end].rstrip()
+            # Important: A window can fall entirely inside a long whitespace run; never emit (and embed) empty text.
+            if piece:
+                yield (page_index, start, piece)
+            if end == n:
+                break
+            start = end - overlap
+
+
+def prepare_pdf_chunks(pdf_path: Path, meta_dir: Path) -> List[Chunk]:
+    # LM: Extract + chunk one PDF and write its metadata sidecar; top-level so a process pool can pickle it.
+    pages = extract_text_from_pdf(pdf_path)
+    session = guess_session_from_filename(pdf_path.name)
+    chunks: List[Chunk] = []
+    for page, offset, text in chunk_text(pages):
+        digest = chunk_digest(text)
+        chunk_id = f"{pdf_path.stem}_p{page}_o{offset}_{digest}"
+        chunks.append(
+            Chunk(
+                id=chunk_id,
+                source_file=pdf_path.name,
+                page=page,
+                session=session,
+                offset=offset,
+                text=text,
+                digest=digest,
+            )
+        )
+    # Optionally persist chunk metadata
+    write_chunk_metadata(chunks, meta_dir / f"{pdf_path.stem}.chunks.parquet")
+    # LM: Drop the JSONL sidecar written by older versions so each PDF has a single metadata file.
+    (meta_dir / f"{pdf_path.stem}.chunks.jsonl").unlink(missing_ok=True)
+    return chunks
+
+
+def write_chunk_metadata(chunks: Sequence[Chunk], meta_file: Path) -> None:
+    # LM: Columnar sidecar: repeated source_file/session values dictionary-encode, and the C writer replaces per-record JSON.
+    table = pa.table(
+        {
+            "id": [c.id for c in chunks],
+            "source_file": [c.source_file for c in chunks],
+            "page": [c.page for c in chunks],
+            "session": [c.session for c in chunks],
+            "offset": [c.offset for c in chunks],
+            "hash": [c.digest for c in chunks],
+            "len": [len(c.text) for c in chunks],
+        },
+        schema=_CHUNK_META_SCHEMA,
+    )
+    pq.write_table(table, meta_file, compression="zstd")
@@ -1,4 +1,10 @@
 from __future__ import annotations
+import asyncio
+import functools
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 import discord
 from discord import app_commands
 from discord.ext import commands
@@ -6,34 +12,71 @@ from pathlib import Path
 from typing import Optional
 
 from config import settings
-from services import KnowledgeBaseService, VectorStore
+from ingest import Chunk, prepare_pdf_chunks
+from services import EmbeddingCache, EmbeddingProvider, FaissVectorStore, KnowledgeBaseService, VectorStore
 
 # LM: Knowledge cog exposes user-facing commands for ingestion & querying.
 # TODO Next Steps: Add `/kb_status` command for observability (counts & last sync time).
 # ? Consideration: Introduce per-guild scoping if multi-guild deployment is needed.
 
-# Instantiate vector store & KB service (simple global for now)
-_vector_store: Optional[VectorStore] = None
-_kb_service: Optional[KnowledgeBaseService] = None
+logger = logging.getLogger("knowledge_cog")
 
+# Important: One sync at a time; a concurrent/retried /sync_pdfs waits, then finds nothing left to ingest.
+_SYNC_LOCK = asyncio.Lock()
 
+
+@functools.lru_cache(maxsize=1)
 def get_kb() -> KnowledgeBaseService:
-    # LM: Lazy singleton initialization (acceptable for current scale; revisit for DI later).
-    global _kb_service, _vector_store
-    if _kb_service is None:
-        _vector_store = VectorStore(settings.vector_dir)
-        _kb_service = KnowledgeBaseService(settings.chunk_dir, _vector_store)
-    return _kb_service
+    # LM: Process-wide singleton (model + Chroma client loaded once); warmed in `Knowledge.cog_load`.
+    embedder = EmbeddingProvider(settings.embeddings_model, quantize=settings.embeddings_quantize)
+    cache = EmbeddingCache(settings.vector_dir / "embcache.sqlite3", settings.embeddings_model)
+    store_cls = FaissVectorStore if settings.vector_backend == "faiss" else VectorStore
+    vector_store = store_cls(settings.vector_dir, embedder, cache=cache)
+    return KnowledgeBaseService(settings.chunk_dir, vector_store)
+
+
+def _name_list(paths: list[Path], limit: int = 10) -> str:
+    # LM: Keeps the sync summary under Discord's message limit for large batches.
+    return ", ".join(p.name for p in paths[:limit]) + (", ..." if len(paths) > limit else "")
+
+
+def _warm_kb() -> None:
+    # LM: Loads model weights & opens the index, then runs one encode so lazy kernel init happens now.
+    get_kb().vector_store.embedder.encode(["warmup"])
 
 
 class Knowledge(commands.Cog):
     # LM: Encapsulates PDF knowledge commands.
     def __init__(self, bot: commands.Bot):
         self.bot = bot
+        self._ingest_pool: Optional[ProcessPoolExecutor] = None
+
+    async def cog_load(self):
+        # Important: Pay model/index startup cost before any command can hit the 3s interaction window.
+        await asyncio.to_thread(_warm_kb)
+
+    async def cog_unload(self):
+        self._reset_ingest_pool()
+
+    def _reset_ingest_pool(self) -> None:
+        # LM: Drops the pool; the next `_get_ingest_pool()` starts fresh workers.
+        if self._ingest_pool is not None:
+            self._ingest_pool.shutdown(wait=False, cancel_futures=True)
+            self._ingest_pool = None
+
+    def _get_ingest_pool(self) -> ProcessPoolExecutor:
+        # Important: "spawn" avoids forking a process that already holds torch/tokenizer threads;
+        # workers only import the light `ingest` module, so startup stays cheap. Pool is reused across syncs.
+        if self._ingest_pool is None:
+            self._ingest_pool = ProcessPoolExecutor(
+                max_workers=max(1, settings.ingest_workers),
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._ingest_pool
 
     @app_commands.command(name="sync_pdfs", description="Ingest PDFs from local drive_raw directory")
     async def sync_pdfs(self, interaction: discord.Interaction):
-        # Important: Full reingest each call; duplicates not de-duplicated yet.
+        # Important: Only new/changed PDFs (per file-digest manifest) are re-ingested.
         if not settings.enable_pdf_qa:
             await interaction.response.send_message("PDF QA feature disabled.", ephemeral=True)
             return
@@ -43,12 +86,67 @@ class Knowledge(commands.Cog):
         if not pdfs:
             await interaction.response.send_message("No PDFs found in drive_raw directory.", ephemeral=True)
             return
+        # Important: Ack immediately; ingestion can far exceed Discord's 3s interaction window.
+        await interaction.response.defer(ephemeral=True, thinking=True)
         kb = get_kb()
-        total_chunks = 0
-        for p in pdfs:
-            ingested = kb.ingest_pdf(p)
-            total_chunks += ingested
-        await interaction.response.send_message(f"Ingested {len(pdfs)} PDFs into {total_chunks} chunks.", ephemeral=True)
+        try:
+            async with _SYNC_LOCK:
+                pending = await asyncio.to_thread(kb.changed_pdfs, pdfs)
+                total_chunks, ingested, failed = await self._ingest(kb, pending)
+                await asyncio.to_thread(kb.mark_ingested, ingested)
+        except Exception:
+            logger.exception("PDF sync failed")
+            await interaction.followup.send("PDF sync failed; see bot logs for details.", ephemeral=True)
+            return
+        skipped = len(pdfs) - len(pending)
+        empty = [p for p, _, n in ingested if n == 0]
+        msg = f"Ingested {len(ingested) - len(empty)} PDFs into {total_chunks} chunks ({skipped} unchanged skipped)."
+        if empty:
+            msg += f"\nNo extractable text in {len(empty)} (unreadable or image-only): {_name_list(empty)}."
+        if failed:
+            msg += f"\nFailed {len(failed)}: {_name_list(failed)} (see bot logs)."
+        await interaction.followup.send(msg, ephemeral=True)
+
+    async def _ingest(
+        self, kb: KnowledgeBaseService, pending: list[tuple[Path, str]]
+    ) -> tuple[int, list[tuple[Path, str, int]], list[Path]]:
+        # Important: Extraction + chunking is pure-Python CPU work; worker processes sidestep the GIL.
+        # LM: Pool size (INGEST_WORKERS) bounds how many PDFs are parsed at once.
+        # LM: Returns (chunk count, (path, digest, chunks) per prepared PDF, failed PDFs).
+        # Important: One bad file never discards the rest.
+        try:
+            results = await self._prepare_all(kb, pending)
+        except BrokenProcessPool:
+            # Important: A worker died in an earlier sync (segfault/OOM) and the pool now rejects submits; rebuild once.
+            logger.warning("Ingest pool was broken; restarting workers.")
+            self._reset_ingest_pool()
+            results = await self._prepare_all(kb, pending)
+        if any(isinstance(r, BrokenProcessPool) for r in results):
+            # LM: A worker died during this sync; its PDFs (and any queued behind it) are reported as failed.
+            logger.warning("Ingest worker died during sync; restarting workers for the next one.")
+            self._reset_ingest_pool()
+        all_chunks: list[Chunk] = []
+        ingested: list[tuple[Path, str, int]] = []
+        failed: list[Path] = []
+        for entry, result in zip(pending, results):
+            if isinstance(result, BaseException):
+                logger.error("Failed to prepare %s", entry[0].name, exc_info=result)
+                failed.append(entry[0])
+                continue
+            all_chunks.extend(result)
+            ingested.append((*entry, len(result)))
+        # LM: One bulk upsert for the whole sync amortizes index writes & embedding batches across PDFs.
+        await asyncio.to_thread(kb.upsert_chunks, all_chunks)
+        return len(all_chunks), ingested, failed
+
+    async def _prepare_all(self, kb: KnowledgeBaseService, pending: list[tuple[Path, str]]) -> list:
+        # LM: One result per pending PDF: its chunks, or the exception raised while preparing it.
+        loop = asyncio.get_running_loop()
+        pool = self._get_ingest_pool()
+        return await asyncio.gather(
+            *(loop.run_in_executor(pool, prepare_pdf_chunks, p, kb.base_dir) for p, _ in pending),
+            return_exceptions=True,
+        )
 
     @app_commands.command(name="ask", description="Ask a question based on campaign PDFs")
     @app_commands.describe(question="Your question about the campaign")
@@ -58,7 +156,8 @@ class Knowledge(commands.Cog):
             await interaction.response.send_message("PDF QA feature disabled.", ephemeral=True)
             return
         kb = get_kb()
-        answer = kb.ask(question)
+        # Important: Retrieval is blocking (encode + HNSW query); keep the event loop free for other commands.
+        answer = await asyncio.to_thread(kb.ask, question, mmr=settings.enable_mmr)
         await interaction.response.send_message(answer[:1900], ephemeral=False)
 
     @app_commands.command(name="session_enemies", description="Estimate enemies fought in a session")
@@ -69,7 +168,7 @@ class Knowledge(commands.Cog):
             await interaction.response.send_message("PDF QA feature disabled.", ephemeral=True)
             return
         kb = get_kb()
-        answer = kb.session_enemies(session)
+        answer = await asyncio.to_thread(kb.session_enemies, session)
         await interaction.response.send_message(answer, ephemeral=False)
 
 
@@ -0,0 +1,23 @@
+from __future__ import annotations
+import logging
+
+from config import settings
+from services import migrate_collection_to_ip
+
+# LM: One-off maintenance script: migrates the persisted Chroma collection to inner-product distance.
+# Important: Stop the bot before running; Chroma's persistent client is not safe for concurrent writers.
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s %(message)s')
+logger = logging.getLogger("rebuild_index")
+
+
+def main():
+    moved = migrate_collection_to_ip(settings.vector_dir)
+    if moved is not None:
+        logger.info("Rebuilt collection with hnsw:space=ip (%d vectors).", moved)
+    else:
+        logger.info("Nothing to migrate: collection already uses hnsw:space=ip or does not exist yet.")
+
+
+if __name__ == "__main__":
+    main()
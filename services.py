@@ -1,189 +1,637 @@
 from __future__ import annotations
-from dataclasses import dataclass
 from pathlib import Path
-from typing import Iterable, List, Optional, Sequence
-import hashlib
-import json
+from typing import Dict, List, Optional, Sequence
+from collections import Counter
+import logging
+import os
+import re
+import sqlite3
+import threading
 
-from pypdf import PdfReader
-from sentence_transformers import SentenceTransformer
-import chromadb
-from chromadb.utils import embedding_functions
+import numpy as np
+import orjson
+import faiss
 
-# LM: Core ingestion & retrieval services: PDF -> text -> chunks -> embeddings (via collection default) -> vector store.
-# TODO Next Steps: Introduce interface abstractions (ITextExtractor, IVectorStore) for easier swapping.
-# ? Consideration: We currently rely on Chroma default embedding; for reproducibility we might switch to explicit SentenceTransformer usage.
+# LM: Ingestion helpers are re-exported so existing `from services import ...` callers keep working.
+from ingest import (  # noqa: F401
+    Chunk,
+    chunk_digest,
+    chunk_text,
+    extract_text_from_pdf,
+    file_digest,
+    guess_session_from_filename,
+    prepare_pdf_chunks,
+)
 
+# LM: Core ingestion & retrieval services: PDF -> text -> chunks -> embeddings (explicit SentenceTransformer) -> vector store.
+# LM: CPU-only extraction/chunking lives in `ingest.py` so worker processes never import the embedding stack.
+# TODO Next Steps: Introduce interface abstractions (ITextExtractor, IVectorStore) for easier swapping.
 
-@dataclass
-class Chunk:
-    # LM: Represents a single semantic chunk of text with provenance metadata.
-    id: str
-    source_file: str
-    page: int
-    session: Optional[int]
-    offset: int
-    text: str
-    sha256: str
+logger = logging.getLogger("services")
 
-    def to_metadata(self) -> dict:
-        return {
-            "source_file": self.source_file,
-            "page": self.page,
-            "session": self.session,
-            "offset": self.offset,
-            "sha256": self.sha256,
-        }
+# Important: Keep each Chroma add under its per-call batch limit (also bounds per-add embedding memory).
+_ADD_BATCH = 5000
+# LM: Any whitespace run (spaces, newlines, tabs); used to flatten excerpts for display.
+# Important: Deliberately Unicode-aware (no re.ASCII) so PDF non-breaking/ideographic spaces are collapsed too.
+_WS = re.compile(r"\s+")
+# LM: Digit runs in a question (session numbers, counts); part of the exact-match key for cached answers.
+_DIGITS = re.compile(r"\d+")
+# LM: Enemy vocabulary as regex fragments (singular/plural); extend here rather than editing the pattern.
+_ENEMY_TERMS = ("goblins?", "orcs?", "bandits?", "wolves?", "skeletons?", "enemies?")
+# LM: "<count> <enemy>" mentions, e.g. "12 goblins"; compiled once for all `session_enemies` calls.
+# LM: Every character Unicode `\s` matches beyond ASCII `\s` (NBSP, thin/narrow/ideographic spaces, line separators).
+_NON_ASCII_WS = "\x1c-\x1f\x85\xa0\u1680\u2000-\u200a\u2028\u2029\u202f\u205f\u3000"
+# Important: ASCII mode skips Unicode class lookups for \d/\b/case-folding (vocab is English); the non-ASCII
+# spaces are listed explicitly so number/noun separators match exactly what Unicode `\s` did.
+_ENEMY_PAT = re.compile(rf"(\b\d+\b)[\s{_NON_ASCII_WS}]+({'|'.join(_ENEMY_TERMS)})", re.I | re.A)
 
 
-def guess_session_from_filename(name: str) -> Optional[int]:
-    # LM: Extract session number from typical filename patterns.
-    # ? Consideration: Might add mapping file for irregular naming.
-    # Heuristic: file names like Session_04.pdf, session-7.pdf, S08_Notes.pdf
-    import re
-    m = re.search(r"[Ss](?:ession)?[ _-]?([0-9]{1,2})", name)
-    if m:
-        try:
-            return int(m.group(1))
-        except ValueError:
-            return None
-    return None
+class EmbeddingProvider:
+    # LM: Explicit sentence-transformer pipeline; one batched forward pass per call instead of per-document encodes.
+    def __init__(self, model_name: str = "all-MiniLM-L6-v2", batch_size: int = 64, quantize: str = "none") -> None:
+        # LM: Heavy ML stack is imported on first use (like torch below), so FAISS/cache code imports without it.
+        from sentence_transformers import SentenceTransformer
 
+        # Important: Dynamic int8 Linear kernels are CPU-only; don't let SentenceTransformer auto-select CUDA for them.
+        self.model = SentenceTransformer(model_name, device="cpu" if quantize == "int8" else None)
+        self.batch_size = batch_size
+        self.quantize = quantize
+        if quantize != "none":
+            self._apply_quantization(quantize)
 
-def extract_text_from_pdf(path: Path) -> List[str]:
-    # LM: Returns list of page texts; blank string placeholder on extraction failure to preserve page indexing.
-    reader = PdfReader(str(path))
-    pages: List[str] = []
-    for p in reader.pages:
-        try:
-            pages.append(p.extract_text() or "")
-        except Exception:
-            pages.append("")
-    return pages
-
-
-def chunk_text(pages: Sequence[str], *, max_chars: int = 1100, overlap: int = 180) -> List[tuple[int, int, str]]:
-    # Important: Overlap preserves context continuity across boundaries for retrieval coherence.
-    # TODO Next Steps: Consider token-based segmentation for multilingual support.
-    chunks: List[tuple[int, int, str]] = []  # (page, offset, text)
-    for page_index, page_text in enumerate(pages, start=1):
-        txt = page_text.strip()
-        if not txt:
-            continue
-        start = 0
-        while start < len(txt):
-            end = min(len(txt), start + max_chars)
-            piece = txt[start:end]
-            chunks.append((page_index, start, piece))
-            if end == len(txt):
-                break
-            start = max(0, end - overlap)
-    return chunks
+    def _apply_quantization(self, mode: str) -> None:
+        # ? Consideration: int8 trades a small amount of retrieval quality for ~2x CPU encode throughput.
+        import torch
 
+        if mode == "int8":
+            self.model = self.model.to("cpu")
+            self.model = torch.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8)
+        elif mode == "fp16":
+            if not torch.cuda.is_available():
+                # Important: Half precision matmuls are slow/unsupported on CPU; keep fp32 there.
+                logger.warning("EMBEDDINGS_QUANTIZE=fp16 requested but no CUDA device found; using fp32.")
+                self.quantize = "none"
+                return
+            self.model = self.model.to("cuda").half()
+        else:
+            raise ValueError(f"Unknown embeddings quantization mode: {mode!r}")
 
-class EmbeddingProvider:
-    # LM: (Currently unused) retained for potential switch to explicit embedding pipeline.
-    def __init__(self, model_name: str = "all-MiniLM-L6-v2") -> None:
-        self.model = SentenceTransformer(model_name)
+    def encode(self, texts: Sequence[str]) -> np.ndarray:
+        # Important: Embeddings are L2-normalized so cosine distance reduces to a dot product.
+        return self.model.encode(
+            list(texts),
+            batch_size=self.batch_size,
+            show_progress_bar=False,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+        )
 
     def embed(self, texts: Sequence[str]) -> List[List[float]]:
-        return [list(vec) for vec in self.model.encode(list(texts), show_progress_bar=False)]
+        return self.encode(texts).tolist()
+
+    @property
+    def dim(self) -> int:
+        return self.model.get_sentence_embedding_dimension()
+
+
+class EmbeddingCache:
+    # LM: On-disk chunk-hash -> vector cache so unchanged chunks are never re-encoded.
+    # Important: Keys include the model name; switching models must not reuse stale vectors.
+    def __init__(self, db_path: Path, model_name: str) -> None:
+        self.model_name = model_name
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS emb (key TEXT PRIMARY KEY, vec BLOB NOT NULL)")
+        self._conn.commit()
+
+    def _key(self, digest: str) -> str:
+        return f"{self.model_name}:{digest}"
+
+    def get_many(self, digests: Sequence[str]) -> Dict[str, np.ndarray]:
+        if not digests:
+            return {}
+        keys = {self._key(d): d for d in digests}
+        out: Dict[str, np.ndarray] = {}
+        with self._lock:
+            # Important: Stay under SQLite's bound-parameter limit on large batches.
+            key_list = list(keys)
+            for i in range(0, len(key_list), 500):
+                batch = key_list[i : i + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, vec FROM emb WHERE key IN ({','.join('?' * len(batch))})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    out[keys[key]] = np.frombuffer(blob, dtype=np.float16).astype(np.float32)
+        return out
+
+    def put_many(self, digests: Sequence[str], vectors: np.ndarray) -> None:
+        # LM: Stored as float16 to halve disk footprint; precision loss is negligible for normalized vectors.
+        rows = [(self._key(d), v.astype(np.float16).tobytes()) for d, v in zip(digests, vectors)]
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO emb (key, vec) VALUES (?, ?)", rows)
+            self._conn.commit()
+
+
+def _embed_chunks(embedder: EmbeddingProvider, cache: Optional[EmbeddingCache], chunks: Sequence[Chunk]) -> np.ndarray:
+    # LM: Encode only cache misses; hits are read back from the on-disk cache.
+    if cache is None:
+        return embedder.encode([c.text for c in chunks])
+    hits = cache.get_many([c.digest for c in chunks])
+    misses = [c for c in chunks if c.digest not in hits]
+    if misses:
+        fresh = embedder.encode([c.text for c in misses])
+        cache.put_many([c.digest for c in misses], fresh)
+        hits.update(zip((c.digest for c in misses), fresh))
+    return np.stack([hits[c.digest] for c in chunks])
+
+
+def _ip_marker(persist_dir: Path, collection_name: str) -> Path:
+    # Important: Chroma's `get_or_create_collection` overwrites collection metadata on existing collections while the
+    # HNSW segment keeps its original space, so `hnsw:space` in metadata can't be trusted; we keep our own marker.
+    return persist_dir / f"chroma.{collection_name}.ip"
+
+
+def _finish_ip_swap(client, collection_name: str, marker: Path):
+    # Important: A migration that died after dropping the original left its complete copy under the temp name;
+    # finish the rename instead of letting a fresh empty collection orphan it. Call only if the original is missing.
+    try:
+        tmp = client.get_collection(name=f"{collection_name}__ip", embedding_function=None)
+    except ValueError:
+        return None
+    tmp.modify(name=collection_name)
+    marker.touch()
+    logger.info("Finished interrupted migration of collection %r to hnsw:space=ip.", collection_name)
+    return client.get_collection(name=collection_name, embedding_function=None)
+
+
+def migrate_collection_to_ip(persist_dir: Path, collection_name: str = "campaign") -> Optional[int]:
+    # LM: One-time rebuild of a Chroma collection into `hnsw:space=ip`, reusing stored vectors (no re-encoding).
+    # Important: Copies into a temporary collection first, so a failure mid-way never loses the original.
+    # LM: Returns the number of vectors copied, or None when there is nothing to migrate (already ip, or no collection).
+    import chromadb
+
+    marker = _ip_marker(persist_dir, collection_name)
+    if marker.exists():
+        return None
+    client = chromadb.PersistentClient(path=str(persist_dir))
+    try:
+        old = client.get_collection(name=collection_name, embedding_function=None)
+    except ValueError:
+        resumed = _finish_ip_swap(client, collection_name, marker)
+        return None if resumed is None else resumed.count()
+    tmp_name = f"{collection_name}__ip"
+    try:
+        client.delete_collection(tmp_name)  # LM: Partial copy from a run interrupted before the swap.
+    except ValueError:
+        pass
+    new = client.create_collection(name=tmp_name, embedding_function=None, metadata={"hnsw:space": "ip"})
+    batch_size = min(_ADD_BATCH, client.get_max_batch_size())
+    total = old.count()
+    for offset in range(0, total, batch_size):
+        page = old.get(limit=batch_size, offset=offset, include=["documents", "metadatas", "embeddings"])
+        embs = np.asarray(page["embeddings"], dtype=np.float32)
+        # LM: Re-normalize defensively; vectors written by Chroma's default embedder were not guaranteed unit length.
+        embs /= np.maximum(np.linalg.norm(embs, axis=1, keepdims=True), 1e-12)
+        new.add(ids=page["ids"], documents=page["documents"], metadatas=page["metadatas"], embeddings=embs.tolist())
+    client.delete_collection(collection_name)
+    new.modify(name=collection_name)
+    marker.touch()
+    return total
+
+
+def mmr_select(query_emb: np.ndarray, cand_embs: np.ndarray, k: int, lambda_mult: float = 0.5) -> List[int]:
+    # LM: Maximal Marginal Relevance: trade relevance to the query against redundancy with already-picked hits.
+    # Important: Expects L2-normalized vectors; all similarities come from one GEMV + one GEMM up front.
+    n = len(cand_embs)
+    if n == 0 or k <= 0:
+        return []
+    rel = cand_embs @ query_emb
+    pair = cand_embs @ cand_embs.T
+    first = int(np.argmax(rel))
+    selected = [first]
+    max_sim = pair[first].copy()
+    for _ in range(min(k, n) - 1):
+        score = lambda_mult * rel - (1.0 - lambda_mult) * max_sim
+        score[selected] = -np.inf
+        j = int(np.argmax(score))
+        selected.append(j)
+        np.maximum(max_sim, pair[j], out=max_sim)
+    return selected
 
 
 class VectorStore:
     # LM: Thin wrapper around Chroma persistent collection.
-    def __init__(self, persist_dir: Path, collection_name: str = "campaign") -> None:
+    # Important: Embeddings are computed by `EmbeddingProvider`; Chroma only stores & searches vectors.
+    def __init__(
+        self,
+        persist_dir: Path,
+        embedder: EmbeddingProvider,
+        collection_name: str = "campaign",
+        cache: Optional[EmbeddingCache] = None,
+    ) -> None:
+        self.embedder = embedder
+        self.cache = cache
+        # LM: Ingest manifest lives beside the index it describes, so wiping/switching stores invalidates it too.
+        self.manifest_file = persist_dir / f"chroma.{collection_name}.manifest.json"
+        # LM: Imported here so the FAISS backend runs without chromadb installed.
+        import chromadb
+
         self.client = chromadb.PersistentClient(path=str(persist_dir))
-        self.collection = self.client.get_or_create_collection(
-            name=collection_name,
-            embedding_function=embedding_functions.DefaultEmbeddingFunction(),
-            metadata={"hnsw:space": "cosine"},
-        )
+        marker = _ip_marker(persist_dir, collection_name)
+        # Important: Vectors are L2-normalized at encode time, so inner product == cosine without per-distance norms.
+        # Important: Only pass `hnsw:space` on create; `get_or_create_collection` would overwrite existing metadata.
+        try:
+            self.collection = self.client.get_collection(name=collection_name, embedding_function=None)
+        except ValueError:
+            self.collection = _finish_ip_swap(self.client, collection_name, marker)
+        if self.collection is not None and not marker.exists() and self.collection.count() == 0:
+            # LM: Empty pre-ip collection: nothing to migrate, just recreate it with the right space.
+            self.client.delete_collection(collection_name)
+            self.collection = None
+        if self.collection is None:
+            self.collection = self.client.create_collection(
+                name=collection_name,
+                embedding_function=None,
+                metadata={"hnsw:space": "ip"},
+            )
+            marker.touch()
+        elif not marker.exists():
+            # LM: Collections created before the switch use `hnsw:space=cosine`; on normalized vectors that ranks and
+            # scores identically, so migrating only drops the per-distance norm computation.
+            logger.info(
+                "Collection %r uses legacy cosine distance (same results); `python rebuild_index.py` switches it to "
+                "inner product.",
+                collection_name,
+            )
+
+    def indexed_sources(self, source_files: Sequence[str]) -> set[str]:
+        # LM: Subset of `source_files` that currently have at least one chunk in the collection.
+        return {
+            name
+            for name in source_files
+            if self.collection.get(where={"source_file": name}, limit=1, include=[])["ids"]
+        }
 
     def upsert_chunks(self, chunks: Sequence[Chunk]) -> None:
-        # TODO Next Steps: Skip already-present chunk IDs to reduce storage duplication.
+        # Important: Chunk IDs embed the content hash, so an existing ID means identical text -> skip.
         if not chunks:
             return
-        self.collection.add(
-            ids=[c.id for c in chunks],
-            documents=[c.text for c in chunks],
-            metadatas=[c.to_metadata() for c in chunks],
-        )
+        sources = sorted({c.source_file for c in chunks})
+        existing = set(self.collection.get(where={"source_file": {"$in": sources}}, include=[])["ids"])
+        # LM: IDs from a previous version of the same file (edited text or older hash scheme) are dropped.
+        stale = existing - {c.id for c in chunks}
+        if stale:
+            self.collection.delete(ids=sorted(stale))
+        chunks = [c for c in chunks if c.id not in existing]
+        batch_size = min(_ADD_BATCH, self.client.get_max_batch_size())
+        for i in range(0, len(chunks), batch_size):
+            batch = chunks[i : i + batch_size]
+            self.collection.add(
+                ids=[c.id for c in batch],
+                documents=[c.text for c in batch],
+                metadatas=[c.to_metadata() for c in batch],
+                embeddings=_embed_chunks(self.embedder, self.cache, batch).tolist(),
+            )
 
-    def similarity_search(self, query: str, k: int = 8) -> List[dict]:
+    def similarity_search(self, query: str, k: int = 8, query_emb: Optional[np.ndarray] = None) -> List[dict]:
         # LM: Returns list of hit dicts with text + metadata + distance (if available).
-        res = self.collection.query(query_texts=[query], n_results=k)
-        out: List[dict] = []
-        for i in range(len(res["ids"][0])):
+        q_embs = None if query_emb is None else query_emb[None, :]
+        return self.similarity_search_batch([query], k=k, query_embs=q_embs)[0]
+
+    def similarity_search_batch(
+        self, queries: Sequence[str], k: int = 8, query_embs: Optional[np.ndarray] = None
+    ) -> List[List[dict]]:
+        # LM: One encode + one Chroma query for N questions; result i holds the hits for queries[i].
+        # LM: `query_embs` lets callers that already encoded the queries skip a second encode.
+        if not queries:
+            return []
+        if query_embs is None:
+            query_embs = self.embedder.encode(queries)
+        res = self.collection.query(query_embeddings=query_embs.tolist(), n_results=k)
+        distances = res.get("distances")
+        out: List[List[dict]] = []
+        for q in range(len(queries)):
             out.append(
-                {
-                    "id": res["ids"][0][i],
-                    "text": res["documents"][0][i],
-                    "metadata": res["metadatas"][0][i],
-                    "distance": res["distances"][0][i] if "distances" in res else None,
-                }
+                [
+                    {
+                        "id": res["ids"][q][i],
+                        "text": res["documents"][q][i],
+                        "metadata": res["metadatas"][q][i],
+                        "distance": distances[q][i] if distances else None,
+                    }
+                    for i in range(len(res["ids"][q]))
+                ]
             )
         return out
 
+    def mmr_search(
+        self,
+        query: str,
+        k: int = 8,
+        fetch_k: Optional[int] = None,
+        lambda_mult: float = 0.5,
+        query_emb: Optional[np.ndarray] = None,
+    ) -> List[dict]:
+        # LM: Over-fetch candidates (with their stored vectors), then diversify down to k via `mmr_select`.
+        q_emb = self.embedder.encode([query])[0] if query_emb is None else query_emb
+        res = self.collection.query(
+            query_embeddings=[q_emb.tolist()],
+            n_results=fetch_k or 4 * k,
+            include=["documents", "metadatas", "distances", "embeddings"],
+        )
+        if not res["ids"][0]:
+            return []
+        cand = np.asarray(res["embeddings"][0], dtype=np.float32)
+        return [
+            {
+                "id": res["ids"][0][i],
+                "text": res["documents"][0][i],
+                "metadata": res["metadatas"][0][i],
+                "distance": res["distances"][0][i],
+            }
+            for i in mmr_select(q_emb, cand, k, lambda_mult)
+        ]
+
+
+class FaissVectorStore:
+    # LM: In-process FAISS alternative to `VectorStore` (same API); exact inner-product search, no document-storage layer.
+    # Important: Exact search is sub-millisecond below ~100K chunks; beyond that prefer Chroma's HNSW.
+    def __init__(
+        self,
+        persist_dir: Path,
+        embedder: EmbeddingProvider,
+        collection_name: str = "campaign",
+        cache: Optional[EmbeddingCache] = None,
+    ) -> None:
+        self.embedder = embedder
+        self.cache = cache
+        self._lock = threading.RLock()
+        self._index_file = persist_dir / f"{collection_name}.faiss"
+        self._docs_file = persist_dir / f"{collection_name}.docs.json"
+        self.manifest_file = persist_dir / f"faiss.{collection_name}.manifest.json"
+        # LM: row id -> (chunk id, text, metadata); row ids are the int64 ids stored in the FAISS index.
+        self.docs: Dict[int, tuple[str, str, dict]] = {}
+        if self._index_file.exists() and self._docs_file.exists():
+            self.index = faiss.read_index(str(self._index_file))
+            self.docs = {int(k): tuple(v) for k, v in orjson.loads(self._docs_file.read_bytes()).items()}
+            self._reconcile()
+        else:
+            self.index = faiss.IndexIDMap2(faiss.IndexFlatIP(embedder.dim))
+        self._row_of = {doc[0]: row for row, doc in self.docs.items()}
+        self._next_row = max(self.docs, default=-1) + 1
+
+    def _reconcile(self) -> None:
+        # Important: Index and docs are two files; if a crash landed between their replaces, drop rows only one side
+        # knows about so searches never hit a row without a document. Affected files are re-ingested on next sync.
+        rows = faiss.vector_to_array(self.index.id_map)
+        orphans = np.setdiff1d(rows, np.fromiter(self.docs, dtype=np.int64, count=len(self.docs)))
+        missing = set(self.docs) - set(rows.tolist())
+        if len(orphans) == 0 and not missing:
+            return
+        logger.warning("FAISS index and docs out of sync (%d/%d rows); dropping them.", len(orphans), len(missing))
+        if len(orphans):
+            self.index.remove_ids(orphans)
+        for row in missing:
+            del self.docs[row]
+
+    def indexed_sources(self, source_files: Sequence[str]) -> set[str]:
+        wanted = set(source_files)
+        with self._lock:
+            return {meta["source_file"] for _, _, meta in self.docs.values() if meta["source_file"] in wanted}
+
+    def upsert_chunks(self, chunks: Sequence[Chunk]) -> None:
+        # Important: Mirrors `VectorStore.upsert_chunks`: skip known IDs, drop stale IDs of re-ingested files.
+        if not chunks:
+            return
+        with self._lock:
+            sources = {c.source_file for c in chunks}
+            new_ids = {c.id for c in chunks}
+            stale = [row for row, (cid, _, meta) in self.docs.items() if meta["source_file"] in sources and cid not in new_ids]
+            if stale:
+                self.index.remove_ids(np.asarray(stale, dtype=np.int64))
+                for row in stale:
+                    del self._row_of[self.docs.pop(row)[0]]
+            chunks = [c for c in chunks if c.id not in self._row_of]
+            if not chunks:
+                self._persist()
+                return
+            embs = np.ascontiguousarray(_embed_chunks(self.embedder, self.cache, chunks), dtype=np.float32)
+            rows = np.arange(self._next_row, self._next_row + len(chunks), dtype=np.int64)
+            self.index.add_with_ids(embs, rows)
+            for row, c in zip(rows.tolist(), chunks):
+                self.docs[row] = (c.id, c.text, c.to_metadata())
+                self._row_of[c.id] = row
+            self._next_row += len(chunks)
+            self._persist()
+
+    def _persist(self) -> None:
+        # Important: Write both files beside the live ones, then swap them in; a crash never leaves a half-written file.
+        index_tmp = self._index_file.with_name(self._index_file.name + ".tmp")
+        docs_tmp = self._docs_file.with_name(self._docs_file.name + ".tmp")
+        faiss.write_index(self.index, str(index_tmp))
+        docs_tmp.write_bytes(orjson.dumps({str(k): v for k, v in self.docs.items()}))
+        os.replace(index_tmp, self._index_file)
+        os.replace(docs_tmp, self._docs_file)
+
+    def similarity_search(self, query: str, k: int = 8, query_emb: Optional[np.ndarray] = None) -> List[dict]:
+        q_embs = None if query_emb is None else query_emb[None, :]
+        return self.similarity_search_batch([query], k=k, query_embs=q_embs)[0]
+
+    def similarity_search_batch(
+        self, queries: Sequence[str], k: int = 8, query_embs: Optional[np.ndarray] = None
+    ) -> List[List[dict]]:
+        # LM: Distance reported as 1 - inner product, i.e. cosine distance for normalized vectors (same as Chroma).
+        if not queries:
+            return []
+        if query_embs is None:
+            query_embs = self.embedder.encode(queries)
+        q_embs = np.ascontiguousarray(query_embs, dtype=np.float32)
+        with self._lock:
+            sims, rows = self.index.search(q_embs, k)
+            out: List[List[dict]] = []
+            for q in range(len(queries)):
+                hits: List[dict] = []
+                for sim, row in zip(sims[q].tolist(), rows[q].tolist()):
+                    if row < 0:  # LM: FAISS pads with -1 when fewer than k vectors are stored.
+                        continue
+                    cid, text, meta = self.docs[row]
+                    hits.append({"id": cid, "text": text, "metadata": meta, "distance": 1.0 - sim})
+                out.append(hits)
+        return out
+
+    def mmr_search(
+        self,
+        query: str,
+        k: int = 8,
+        fetch_k: Optional[int] = None,
+        lambda_mult: float = 0.5,
+        query_emb: Optional[np.ndarray] = None,
+    ) -> List[dict]:
+        # LM: Same contract as `VectorStore.mmr_search`; candidate vectors are reconstructed from the flat index.
+        if query_emb is None:
+            query_emb = self.embedder.encode([query])[0]
+        q_emb = np.ascontiguousarray(query_emb, dtype=np.float32)
+        with self._lock:
+            sims, rows = self.index.search(q_emb[None, :], fetch_k or 4 * k)
+            found = [(sim, row) for sim, row in zip(sims[0].tolist(), rows[0].tolist()) if row >= 0]
+            if not found:
+                return []
+            cand = np.stack([self.index.reconstruct(row) for _, row in found])
+            out: List[dict] = []
+            for i in mmr_select(q_emb, cand, k, lambda_mult):
+                sim, row = found[i]
+                cid, text, meta = self.docs[row]
+                out.append({"id": cid, "text": text, "metadata": meta, "distance": 1.0 - sim})
+        return out
+
+
+class SemanticAnswerCache:
+    # LM: Remembers recent /ask answers keyed by question embedding; near-identical questions skip retrieval.
+    # Important: In-memory only and must be cleared whenever the indexed corpus changes.
+    def __init__(self, dim: int, threshold: float = 0.95, capacity: int = 1024, probe: int = 8) -> None:
+        self.threshold = threshold
+        self.capacity = capacity
+        self.probe = probe
+        self._lock = threading.Lock()
+        self._index = faiss.IndexFlatIP(dim)
+        # LM: Position i in this list matches row i of the index (FIFO order, oldest first).
+        self._entries: List[tuple[tuple, str]] = []
+        # LM: Bumped by `clear()`; answers computed against an older corpus are not stored.
+        self._generation = 0
+
+    @property
+    def generation(self) -> int:
+        # Important: Read before retrieval and pass to `put()`, so a sync finishing mid-/ask can't cache a stale answer.
+        return self._generation
+
+    def get(self, q_emb: np.ndarray, params: tuple) -> Optional[str]:
+        with self._lock:
+            if not self._entries:
+                return None
+            # LM: Several neighbours, since near-identical questions (e.g. other session numbers) sit side by side.
+            sims, rows = self._index.search(q_emb[None, :], min(self.probe, len(self._entries)))
+            for sim, row in zip(sims[0].tolist(), rows[0].tolist()):
+                if row < 0 or sim <= self.threshold:
+                    break
+                cached_params, answer = self._entries[row]
+                # LM: Different retrieval options (k, MMR) or different numbers in the question is a miss.
+                if cached_params == params:
+                    return answer
+            return None
+
+    def put(self, q_emb: np.ndarray, params: tuple, answer: str, generation: int) -> None:
+        with self._lock:
+            if generation != self._generation:
+                return
+            if len(self._entries) >= self.capacity:
+                # LM: Flat-index removal compacts rows, so dropping row 0 keeps positions aligned with `_entries`.
+                self._index.remove_ids(np.arange(1, dtype=np.int64))
+                self._entries.pop(0)
+            self._index.add(q_emb[None, :])
+            self._entries.append((params, answer))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._index.reset()
+            self._entries.clear()
+            self._generation += 1
+
+
+def _summarize(text: str) -> str:
+    # Simple heuristic summary: first 220 chars up to sentence end.
+    # LM: One regex pass collapses all whitespace runs (newlines included) instead of strip + replace copies.
+    snippet = _WS.sub(" ", text).strip()
+    if len(snippet) > 220:
+        snippet = snippet[:220]
+        cut = snippet.rfind(".")
+        snippet = (snippet[:cut] if cut >= 0 else snippet) + "."
+    return snippet
+
+
+def _hit_location(meta: dict) -> str:
+    loc = f"{meta.get('source_file')} p{meta.get('page')}"
+    if meta.get("session"):
+        loc += f" (Session {meta['session']})"
+    return loc
+
 
 class KnowledgeBaseService:
     # LM: Orchestrates ingestion & query logic; business-facing API.
-    def __init__(self, base_dir: Path, vector_store: VectorStore) -> None:
+    def __init__(self, base_dir: Path, vector_store: VectorStore | FaissVectorStore) -> None:
         self.base_dir = base_dir
         self.vector_store = vector_store
+        self.answer_cache = SemanticAnswerCache(vector_store.embedder.dim)
+
+    @property
+    def manifest_file(self) -> Path:
+        # LM: file name -> {"digest", "chunks"} of the last successful ingest, owned by the active vector store.
+        return self.vector_store.manifest_file
+
+    def _load_manifest(self) -> Dict[str, dict]:
+        if not self.manifest_file.exists():
+            return {}
+        manifest = orjson.loads(self.manifest_file.read_bytes())
+        # LM: Older manifests stored the bare digest; chunk count unknown there.
+        return {name: {"digest": e} if isinstance(e, str) else e for name, e in manifest.items()}
+
+    def changed_pdfs(self, pdf_paths: Sequence[Path]) -> List[tuple[Path, str]]:
+        # LM: Returns (path, digest) for PDFs that are new or differ from the manifest; retries of a sync become no-ops.
+        # Important: The store is the source of truth; a manifest entry is trusted only if the store holds that file,
+        # or the manifest recorded it as yielding no chunks (unreadable / image-only PDFs have nothing to store).
+        # Chunk-ID dedup + embedding cache keep a redundant re-ingest cheap.
+        manifest = self._load_manifest()
+        indexed = self.vector_store.indexed_sources([p.name for p in pdf_paths])
+        out: List[tuple[Path, str]] = []
+        for p in pdf_paths:
+            digest = file_digest(p)
+            entry = manifest.get(p.name, {})
+            known = p.name in indexed or entry.get("chunks") == 0
+            if entry.get("digest") != digest or not known:
+                out.append((p, digest))
+        return out
+
+    def mark_ingested(self, entries: Sequence[tuple[Path, str, int]]) -> None:
+        # LM: `entries` are (path, digest, chunk count); zero-chunk files are remembered so they aren't re-parsed.
+        # Important: Call only after the vector store upsert succeeded, otherwise failed files would be skipped forever.
+        manifest = self._load_manifest()
+        manifest.update({p.name: {"digest": digest, "chunks": n} for p, digest, n in entries})
+        self.manifest_file.write_bytes(orjson.dumps(manifest, option=orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS))
 
     def ingest_pdf(self, pdf_path: Path) -> int:
-        # Important: Full re-chunk each ingest; no incremental diffing yet.
-        # TODO Next Steps: Implement hash index to skip re-indexing unchanged chunks.
-        pages = extract_text_from_pdf(pdf_path)
-        session = guess_session_from_filename(pdf_path.name)
-        raw_chunks = chunk_text(pages)
-        chunks: List[Chunk] = []
-        for idx, (page, offset, text) in enumerate(raw_chunks):
-            sha = hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
-            chunk_id = f"{pdf_path.stem}_p{page}_o{offset}_{sha}"
-            chunks.append(
-                Chunk(
-                    id=chunk_id,
-                    source_file=pdf_path.name,
-                    page=page,
-                    session=session,
-                    offset=offset,
-                    text=text,
-                    sha256=sha,
-                )
-            )
-        self.vector_store.upsert_chunks(chunks)
-        # Optionally persist chunk metadata
-        meta_file = self.base_dir / f"{pdf_path.stem}.chunks.jsonl"
-        with meta_file.open("w", encoding="utf-8") as f:
-            for c in chunks:
-                rec = {"id": c.id, **c.to_metadata()}
-                rec["len"] = len(c.text)
-                f.write(json.dumps(rec) + "\n")
+        # Important: Full re-chunk each ingest; unchanged chunks are skipped at upsert (ID check + embedding cache).
+        chunks = self.prepare_chunks(pdf_path)
+        self.upsert_chunks(chunks)
         return len(chunks)
 
-    def ask(self, query: str, k: int = 6) -> str:
+    def upsert_chunks(self, chunks: Sequence[Chunk]) -> None:
+        # Important: Cached answers may cite replaced/missing chunks once the corpus changes; drop them.
+        self.vector_store.upsert_chunks(chunks)
+        self.answer_cache.clear()
+
+    def prepare_chunks(self, pdf_path: Path) -> List[Chunk]:
+        # LM: Extract + chunk + write metadata sidecar, without touching the vector store (callers bulk-upsert).
+        return prepare_pdf_chunks(pdf_path, self.base_dir)
+
+    def ask(self, query: str, k: int = 6, mmr: bool = False) -> str:
         # LM: Naive retrieve-and-summarize (extractive) answer; future summarizer may condense multi-chunk context.
-        hits = self.vector_store.similarity_search(query, k=k)
+        # ? Consideration: MMR trades a little top-1 relevance for less repetitive excerpts (overlapping chunks).
+        q_emb = np.ascontiguousarray(self.vector_store.embedder.encode([query])[0], dtype=np.float32)
+        # Important: MiniLM scores "session 3?" vs "session 4?" as near-duplicates; numbers must match exactly.
+        params = (k, mmr, tuple(int(d) for d in _DIGITS.findall(query)))
+        generation = self.answer_cache.generation
+        cached = self.answer_cache.get(q_emb, params)
+        if cached is not None:
+            return cached
+        if mmr:
+            hits = self.vector_store.mmr_search(query, k=k, query_emb=q_emb)
+        else:
+            hits = self.vector_store.similarity_search(query, k=k, query_emb=q_emb)
         if not hits:
             return "No relevant passages found."
-
-        def summarize(text: str) -> str:
-            # Simple heuristic summary: first 220 chars up to sentence end.
-            snippet = text.strip().replace("\n", " ")
-            if len(snippet) > 220:
-                snippet = snippet[:220].rsplit(".", 1)[0] + "."
-            return snippet
-
-        lines: List[str] = []
-        for h in hits:
-            meta = h["metadata"]
-            loc = f"{meta.get('source_file')} p{meta.get('page')}"
-            if meta.get("session"):
-                loc += f" (Session {meta['session']})"
-            lines.append(f"- {loc}: {summarize(h['text'])}")
-        answer = "Top relevant excerpts:\n" + "\n".join(lines)
+        answer = "Top relevant excerpts:\n" + "\n".join(
+            f"- {_hit_location(h['metadata'])}: {_summarize(h['text'])}" for h in hits
+        )
+        self.answer_cache.put(q_emb, params, answer, generation)
         return answer
 
     def session_enemies(self, session: int) -> str:
@@ -192,16 +640,12 @@ class KnowledgeBaseService:
         # Query for potential enemy lines
         base_query = f"Session {session} enemies battle fight encountered"
         hits = self.vector_store.similarity_search(base_query, k=12)
-        import re
-        enemy_counts: dict[str, int] = {}
-        total = 0
-        pat = re.compile(r"(\b\d+\b)\s+(goblins?|orcs?|bandits?|wolves?|skeletons?|enemies?)", re.I)
-        for h in hits:
-            for m in pat.finditer(h["text"]):
-                num = int(m.group(1))
-                enemy = m.group(2).lower().rstrip("s")
-                enemy_counts[enemy] = enemy_counts.get(enemy, 0) + num
-                total += num
+        # LM: One regex pass over all hits instead of one per hit.
+        # Important: NUL separator is not whitespace, so a match can never straddle two hits.
+        enemy_counts: Counter[str] = Counter()
+        for m in _ENEMY_PAT.finditer("\0".join(h["text"] for h in hits)):
+            enemy_counts[m.group(2).lower().rstrip("s")] += int(m.group(1))
+        total = sum(enemy_counts.values())
         if not enemy_counts:
             return f"No enemy data inferred for session {session}."
         breakdown = ", ".join(f"{k}: {v}" for k, v in sorted(enemy_counts.items()))
@@ -0,0 +1,97 @@
+import random
+
+import pytest
+
+import ingest
+from ingest import Chunk, chunk_text, extract_text_from_pdf, guess_session_from_filename
+
+# LM: Property checks for `chunk_text`; offsets are relative to the stripped page text.
+
+
+def _check_chunks(page: str, chunks, *, max_chars: int) -> None:
+    txt = page.strip()
+    covered = [False] * len(txt)
+    prev_offset = -1
+    for _, offset, piece in chunks:
+        assert piece, "empty chunk emitted"
+        assert len(piece) <= max_chars
+        assert txt[offset : offset + len(piece)] == piece
+        assert offset > prev_offset, "chunker did not advance"
+        prev_offset = offset
+        for i in range(offset, offset + len(piece)):
+            covered[i] = True
+    # Important: Only whitespace trimmed off chunk ends may be left uncovered.
+    assert all(c or txt[i].isspace() for i, c in enumerate(covered))
+
+
+def _random_text(rng: random.Random, n_words: int) -> str:
+    words = []
+    for _ in range(n_words):
+        word = "".join(rng.choice("abcdefghij") for _ in range(rng.randint(1, 12)))
+        if rng.random() < 0.1:
+            word += rng.choice(".!?")
+        words.append(word)
+    # LM: Occasional long whitespace runs (PDF layout gaps) so some windows land entirely inside whitespace.
+    seps = [rng.choice([" ", "  ", "\n"]) if rng.random() < 0.97 else " " * rng.randint(50, 400) for _ in words]
+    return "".join(w + sep for w, sep in zip(words, seps))
+
+
+@pytest.mark.parametrize("max_chars,overlap", [(1100, 180), (200, 50), (120, 0), (50, 49)])
+def test_chunk_text_properties(max_chars, overlap):
+    rng = random.Random(max_chars * 1000 + overlap)
+    for _ in range(200):
+        page = _random_text(rng, rng.randint(0, 400))
+        chunks = list(chunk_text([page], max_chars=max_chars, overlap=overlap))
+        _check_chunks(page, chunks, max_chars=max_chars)
+
+
+def test_chunk_text_snaps_to_sentence_end():
+    page = " ".join(f"Sentence number {i} is here." for i in range(100))
+    chunks = list(chunk_text([page], max_chars=300, overlap=40))
+    assert len(chunks) > 1
+    # LM: Every chunk except the last should end on a sentence boundary.
+    assert all(piece.endswith(".") for _, _, piece in chunks[:-1])
+
+
+def test_chunk_text_without_boundaries_uses_full_windows():
+    chunks = list(chunk_text(["x" * 1000], max_chars=300, overlap=0))
+    assert [(o, len(p)) for _, o, p in chunks] == [(0, 300), (300, 300), (600, 300), (900, 100)]
+
+
+def test_chunk_text_skips_whitespace_only_windows():
+    chunks = list(chunk_text(["a" + " " * 2500 + "b"]))
+    assert all(piece.strip() for _, _, piece in chunks)
+    assert [piece.strip() for _, _, piece in chunks] == ["a", "b"]
+
+
+def test_chunk_text_skips_blank_pages_and_keeps_page_numbers():
+    chunks = list(chunk_text(["", "   \n", "hello world"]))
+    assert chunks == [(3, 0, "hello world")]
+
+
+@pytest.mark.parametrize(
+    "name,expected",
+    [
+        ("Session_04.pdf", 4),
+        ("session-7.pdf", 7),
+        ("S08_Notes.pdf", 8),
+        ("Lore_Handout.pdf", None),
+    ],
+)
+def test_guess_session_from_filename(name, expected):
+    assert guess_session_from_filename(name) == expected
+
+
+@pytest.mark.parametrize("content", [b"garbage, not a pdf", b""])
+def test_extract_text_from_unreadable_pdf_returns_no_pages(tmp_path, content):
+    bad = tmp_path / "broken.pdf"
+    bad.write_bytes(content)
+    assert extract_text_from_pdf(bad) == []
+    assert ingest._extract_with_pypdf(bad) == []
+
+
+def test_chunk_metadata_omits_unknown_session():
+    chunk = Chunk(id="x", source_file="Lore_Handout.pdf", page=1, session=None, offset=0, text="t", digest="d")
+    meta = chunk.to_metadata()
+    assert "session" not in meta
+    assert None not in meta.values()
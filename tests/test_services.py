@@ -0,0 +1,250 @@
+import re
+import sys
+
+import numpy as np
+import orjson
+import pytest
+
+from ingest import Chunk, chunk_digest, file_digest
+from services import (
+    FaissVectorStore,
+    KnowledgeBaseService,
+    SemanticAnswerCache,
+    VectorStore,
+    migrate_collection_to_ip,
+    mmr_select,
+)
+
+# LM: Service tests run on numpy + faiss (Chroma ones skip without chromadb); a hash-seeded fake embedder stands in
+# for SentenceTransformer.
+
+
+class FakeEmbedder:
+    dim = 16
+
+    def encode(self, texts):
+        out = np.stack([np.random.default_rng(abs(hash(t)) % 2**32).standard_normal(self.dim) for t in texts])
+        return (out / np.linalg.norm(out, axis=1, keepdims=True)).astype(np.float32)
+
+
+def _chunk(source: str, offset: int, text: str) -> Chunk:
+    digest = chunk_digest(text)
+    return Chunk(
+        id=f"{source}_p1_o{offset}_{digest}",
+        source_file=source,
+        page=1,
+        session=None,
+        offset=offset,
+        text=text,
+        digest=digest,
+    )
+
+
+def test_faiss_store_upsert_search_and_reload(tmp_path):
+    store = FaissVectorStore(tmp_path, FakeEmbedder())
+    store.upsert_chunks([_chunk("a.pdf", 0, "alpha"), _chunk("a.pdf", 10, "beta"), _chunk("b.pdf", 0, "gamma")])
+    hits = store.similarity_search("beta", k=2)
+    assert hits[0]["text"] == "beta"
+    assert abs(hits[0]["distance"]) < 1e-5
+    assert store.indexed_sources(["a.pdf", "b.pdf", "c.pdf"]) == {"a.pdf", "b.pdf"}
+
+    reloaded = FaissVectorStore(tmp_path, FakeEmbedder())
+    assert reloaded.index.ntotal == 3
+    assert reloaded.similarity_search("gamma", k=1)[0]["id"] == _chunk("b.pdf", 0, "gamma").id
+
+
+def test_faiss_store_prunes_stale_chunks_of_reingested_file(tmp_path):
+    store = FaissVectorStore(tmp_path, FakeEmbedder())
+    store.upsert_chunks([_chunk("a.pdf", 0, "alpha"), _chunk("a.pdf", 10, "beta"), _chunk("b.pdf", 0, "gamma")])
+    store.upsert_chunks([_chunk("a.pdf", 0, "alpha"), _chunk("a.pdf", 10, "delta")])
+    texts = sorted(text for _, text, _ in store.docs.values())
+    assert texts == ["alpha", "delta", "gamma"]
+    assert store.index.ntotal == 3
+    assert [h["text"] for h in store.similarity_search("beta", k=5)].count("beta") == 0
+
+    reloaded = FaissVectorStore(tmp_path, FakeEmbedder())
+    assert sorted(text for _, text, _ in reloaded.docs.values()) == texts
+    # LM: Rows keep increasing after reload, so new chunks never reuse a live row id.
+    reloaded.upsert_chunks([_chunk("c.pdf", 0, "epsilon")])
+    assert len(set(reloaded.docs)) == reloaded.index.ntotal == 4
+
+
+def test_faiss_store_drops_rows_missing_from_docs_on_load(tmp_path):
+    store = FaissVectorStore(tmp_path, FakeEmbedder())
+    store.upsert_chunks([_chunk("a.pdf", 0, "alpha")])
+    old_docs = store._docs_file.read_bytes()
+    store.upsert_chunks([_chunk("b.pdf", 0, "beta")])
+    # LM: Simulate a crash after the index swap but before the docs swap.
+    store._docs_file.write_bytes(old_docs)
+
+    reloaded = FaissVectorStore(tmp_path, FakeEmbedder())
+    assert reloaded.index.ntotal == 1
+    assert [h["text"] for h in reloaded.similarity_search("beta", k=5)] == ["alpha"]
+    assert reloaded.indexed_sources(["a.pdf", "b.pdf"]) == {"a.pdf"}
+    assert set(orjson.loads(old_docs)) == {str(row) for row in reloaded.docs}
+
+
+def test_chroma_store_accepts_chunks_without_session(tmp_path):
+    pytest.importorskip("chromadb")
+    store = VectorStore(tmp_path, FakeEmbedder())
+    store.upsert_chunks([_chunk("Lore_Handout.pdf", 0, "alpha"), _chunk("Session_02.pdf", 0, "beta")])
+    assert store.collection.count() == 2
+    hit = store.similarity_search("alpha", k=1)[0]
+    assert hit["text"] == "alpha"
+    assert "session" not in hit["metadata"]
+
+
+def test_changed_pdfs_trusts_manifest_only_for_indexed_or_known_empty_files(tmp_path):
+    pdf_dir = tmp_path / "pdfs"
+    pdf_dir.mkdir()
+    full, empty, lost = (pdf_dir / n for n in ("full.pdf", "empty.pdf", "lost.pdf"))
+    for p in (full, empty, lost):
+        p.write_bytes(p.name.encode())
+    kb = KnowledgeBaseService(tmp_path, FaissVectorStore(tmp_path, FakeEmbedder()))
+    assert [p for p, _ in kb.changed_pdfs([full, empty, lost])] == [full, empty, lost]
+
+    kb.upsert_chunks([_chunk("full.pdf", 0, "alpha")])
+    digests = dict(kb.changed_pdfs([full, empty, lost]))
+    # LM: lost.pdf claims chunks in the manifest, but the store doesn't hold any (e.g. index wiped).
+    kb.mark_ingested([(full, digests[full], 1), (empty, digests[empty], 0), (lost, digests[lost], 3)])
+    assert kb.manifest_file.parent == tmp_path
+    assert [p for p, _ in kb.changed_pdfs([full, empty, lost])] == [lost]
+
+    empty.write_bytes(b"now with text")
+    assert [p for p, _ in kb.changed_pdfs([full, empty])] == [empty]
+
+
+def test_changed_pdfs_reads_legacy_digest_only_manifest(tmp_path):
+    pdf = tmp_path / "a.pdf"
+    pdf.write_bytes(b"a")
+    kb = KnowledgeBaseService(tmp_path, FaissVectorStore(tmp_path, FakeEmbedder()))
+    kb.upsert_chunks([_chunk("a.pdf", 0, "alpha")])
+    kb.manifest_file.write_bytes(orjson.dumps({"a.pdf": file_digest(pdf)}))
+    assert kb.changed_pdfs([pdf]) == []
+
+
+def _unit(*xs: float) -> np.ndarray:
+    v = np.asarray(xs, dtype=np.float32)
+    return v / np.linalg.norm(v)
+
+
+def test_mmr_select_prefers_diverse_candidates():
+    q = _unit(1, 0, 0)
+    cand = np.stack([_unit(1, 0.1, 0), _unit(1, 0.11, 0), _unit(1, 0, 1)])
+    assert mmr_select(q, cand, k=2, lambda_mult=1.0) == [0, 1]
+    assert mmr_select(q, cand, k=2, lambda_mult=0.5) == [0, 2]
+    assert sorted(mmr_select(q, cand, k=10)) == [0, 1, 2]
+    assert mmr_select(q, cand[:0], k=3) == []
+
+
+def test_answer_cache_fifo_eviction_keeps_rows_aligned():
+    cache = SemanticAnswerCache(dim=4, capacity=3)
+    vecs = [_unit(*row) for row in np.eye(4)]
+    for i, v in enumerate(vecs):
+        cache.put(v, (), f"answer {i}", cache.generation)
+    assert cache.get(vecs[0], ()) is None
+    assert [cache.get(v, ()) for v in vecs[1:]] == ["answer 1", "answer 2", "answer 3"]
+
+
+def test_answer_cache_probes_past_neighbours_with_other_params():
+    cache = SemanticAnswerCache(dim=3)
+    cache.put(_unit(1, 0.02, 0), (6, False, (4,)), "session 4", cache.generation)
+    cache.put(_unit(1, 0.01, 0), (6, False, (3,)), "session 3", cache.generation)
+    q = _unit(1, 0, 0)
+    assert cache.get(q, (6, False, (4,))) == "session 4"
+    assert cache.get(q, (6, False, (3,))) == "session 3"
+    assert cache.get(q, (6, True, (3,))) is None
+    assert cache.get(_unit(0, 1, 0), (6, False, (3,))) is None
+
+
+def test_answer_cache_drops_answers_computed_before_clear():
+    cache = SemanticAnswerCache(dim=3)
+    generation = cache.generation
+    cache.clear()  # LM: A sync finished while the answer was being computed.
+    cache.put(_unit(1, 0, 0), (), "stale", generation)
+    assert cache.get(_unit(1, 0, 0), ()) is None
+    cache.put(_unit(1, 0, 0), (), "fresh", cache.generation)
+    assert cache.get(_unit(1, 0, 0), ()) == "fresh"
+
+
+class DigitBlindEmbedder(FakeEmbedder):
+    # LM: Mimics MiniLM treating "session 3" and "session 4" as the same question.
+    def encode(self, texts):
+        return super().encode([re.sub(r"\d", "", t) for t in texts])
+
+
+def test_ask_cache_key_includes_numbers_in_question(tmp_path):
+    kb = KnowledgeBaseService(tmp_path, FaissVectorStore(tmp_path, DigitBlindEmbedder()))
+    kb.upsert_chunks([_chunk("Session_03.pdf", 0, "We fought 3 goblins.")])
+    calls = []
+    search = kb.vector_store.similarity_search
+    kb.vector_store.similarity_search = lambda *a, **kw: calls.append(a[0]) or search(*a, **kw)
+
+    kb.ask("enemies in session 3")
+    kb.ask("enemies in session 4")
+    kb.ask("enemies in session 3")
+    assert calls == ["enemies in session 3", "enemies in session 4"]
+
+    kb.upsert_chunks([_chunk("Session_04.pdf", 0, "We fought 4 orcs.")])
+    kb.ask("enemies in session 3")
+    assert len(calls) == 3
+
+
+def _legacy_cosine_collection(path, texts):
+    chromadb = pytest.importorskip("chromadb")
+    coll = chromadb.PersistentClient(path=str(path)).create_collection(
+        name="campaign", embedding_function=None, metadata={"hnsw:space": "cosine"}
+    )
+    embs = FakeEmbedder().encode(texts)
+    coll.add(ids=list(texts), documents=list(texts), embeddings=embs.tolist())
+
+
+def test_migrate_collection_to_ip_copies_legacy_collection_once(tmp_path):
+    _legacy_cosine_collection(tmp_path, ["alpha", "beta"])
+    VectorStore(tmp_path, FakeEmbedder())  # LM: Opening must not rewrite the legacy metadata or set the marker.
+    assert migrate_collection_to_ip(tmp_path) == 2
+    assert migrate_collection_to_ip(tmp_path) is None
+    store = VectorStore(tmp_path, FakeEmbedder())
+    assert store.collection.metadata["hnsw:space"] == "ip"
+    assert store.similarity_search("beta", k=1)[0]["text"] == "beta"
+
+
+def test_migrate_collection_to_ip_without_collection_is_a_no_op(tmp_path):
+    pytest.importorskip("chromadb")
+    assert migrate_collection_to_ip(tmp_path) is None
+
+
+def test_interrupted_ip_swap_is_finished_instead_of_orphaned(tmp_path):
+    chromadb = pytest.importorskip("chromadb")
+    _legacy_cosine_collection(tmp_path, ["alpha", "beta"])
+    client = chromadb.PersistentClient(path=str(tmp_path))
+    # LM: Simulate a migration that died right after dropping the original.
+    client.get_collection("campaign").modify(name="campaign__ip")
+    store = VectorStore(tmp_path, FakeEmbedder())
+    assert store.collection.count() == 2
+    assert migrate_collection_to_ip(tmp_path) is None
+
+
+class StaticHitsStore:
+    # LM: Returns fixed hits; `session_enemies` only needs `similarity_search`.
+    embedder = FakeEmbedder()
+
+    def __init__(self, texts):
+        self.texts = texts
+
+    def similarity_search(self, query, k=8, query_emb=None):
+        return [{"id": str(i), "text": t, "metadata": {}, "distance": 0.0} for i, t in enumerate(self.texts)]
+
+
+def test_session_enemies_counts_across_hits_without_joining_them(tmp_path):
+    hits = ["We met 12 goblins and 3 orcs.", "Later 2 Goblins fled. 4", "wolves"]
+    kb = KnowledgeBaseService(tmp_path, StaticHitsStore(hits))
+    # LM: "4" ends one hit and "wolves" starts the next; the NUL join must keep them apart.
+    assert kb.session_enemies(2) == "Session 2: total 17 enemies (goblin: 14, orc: 3)."
+
+
+def test_session_enemies_matches_every_unicode_space_between_count_and_noun(tmp_path):
+    spaces = [chr(c) for c in range(sys.maxunicode + 1) if re.match(r"\s", chr(c))]
+    kb = KnowledgeBaseService(tmp_path, StaticHitsStore([f"{len(spaces)}{sp}bandits" for sp in spaces]))
+    assert {"\u00a0", "\u2009", "\u202f", "\u3000"} <= set(spaces)
+    assert kb.session_enemies(1) == f"Session 1: total {len(spaces) ** 2} enemies (bandit: {len(spaces) ** 2})."